@@ -1,46 +1,268 @@
 # batch_process.py
+# Usage:
+#   python batch_process.py                                   # prompts.txt -> responses.txt
+#   python batch_process.py --trace trace.json                # + Chrome trace and timing summary
+#   python batch_process.py --prompts jobs.jsonl              # per-record models: {"prompt": "...", "model": "..."}
+#   python batch_process.py --record traffic.jsonl --redact   # capture traffic for ollama_replay.py
+import os
 import asyncio
-from openai import AsyncOpenAI
+import argparse
+import json
+import re
+import time
+from datetime import datetime
+import httpx
 import aiofiles
 
-async def process_prompt(client, prompt, model="gpt-oss:120b"):
-    """Process a single prompt asynchronously."""
+from ollama_trace import Tracer
+
+# Responses whose load_duration exceeds this actually (re)loaded weights;
+# requests against an already-resident model report a few ms.
+LOAD_THRESHOLD_NS = 500_000_000
+
+def normalize_model(name):
+    """Ollama treats 'gpt-oss' and 'gpt-oss:latest' as the same model."""
+    name = name.strip()
+    return name if ":" in name else f"{name}:latest"
+
+def read_records(lines, is_jsonl, default_model):
+    """Parse input lines into [{"prompt": str, "model": str}] in input order."""
+    if not is_jsonl:
+        return [{"prompt": line.strip(), "model": normalize_model(default_model)} for line in lines]
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        records.append({"prompt": rec["prompt"], "model": normalize_model(rec.get("model") or default_model)})
+    return records
+
+def _expiry_key(entry):
+    """Sort key for an /api/ps entry: its expires_at time, then its name."""
+    name = normalize_model(entry.get("name") or entry["model"])
+    # Ollama reports nanosecond fractions; fromisoformat accepts at most six digits.
+    stamp = re.sub(r"(\.\d{6})\d+", r"\1", entry.get("expires_at") or "")
     try:
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
-        return prompt, response.choices[0].message.content
+        return datetime.fromisoformat(stamp.replace("Z", "+00:00")).timestamp(), name
+    except ValueError:
+        return float("inf"), name
+
+async def fetch_resident_models(client):
+    """Return the models currently loaded on the server (/api/ps).
+
+    Ordered by expires_at, soonest first: with a shared keep_alive that is
+    least recently used first, the order Ollama evicts them in.
+    """
+    try:
+        resp = await client.get("/api/ps", timeout=10)
+        resp.raise_for_status()
+        entries = sorted(resp.json().get("models", []), key=_expiry_key)
+        return [normalize_model(m.get("name") or m["model"]) for m in entries]
+    except (httpx.HTTPError, ValueError, KeyError) as e:
+        print(f"⚠ Could not read /api/ps, assuming nothing is resident: {e}")
+        return []
+
+def plan_groups(records, resident):
+    """Group record indices by model and order the groups.
+
+    Returns (warm, cold, groups): warm models are already resident and are
+    drained first; cold models follow one at a time, so each is loaded once.
+    """
+    groups = {}
+    for i, rec in enumerate(records):
+        groups.setdefault(rec["model"], []).append(i)
+    warm = [m for m in groups if m in resident]
+    cold = [m for m in groups if m not in resident]
+    return warm, cold, groups
+
+def count_naive_loads(models, resident, capacity):
+    """Estimate loads per model if records ran in input order (LRU, capacity models).
+
+    A lower bound: Ollama also evicts early when VRAM runs out.
+    """
+    cache = list(resident)  # least recently used first, as from fetch_resident_models()
+    loads = {}
+    for m in models:
+        if m in cache:
+            cache.remove(m)
+        else:
+            loads[m] = loads.get(m, 0) + 1
+            if len(cache) >= capacity:
+                cache.pop(0)
+        cache.append(m)
+    return loads
+
+async def process_prompt(client, prompt, model="gpt-oss:120b", tracer=None, keep_alive=None, recorder=None):
+    """Process a single prompt asynchronously via Ollama's native /api/chat.
+
+    Returns (prompt, response, stats) where stats holds the server-reported
+    durations from the final chunk (empty on error).
+    """
+    tracer = tracer or Tracer(enabled=False)
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "options": {"temperature": 0.7},
+        "stream": True,
+    }
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    sent = recorder.now() if recorder else 0.0
+    first_token = None
+    status = 0
+    try:
+        parts = []
+        stats = {}
+        with tracer.span("http"):
+            async with client.stream("POST", "/api/chat", json=payload) as resp:
+                status = resp.status_code
+                if resp.status_code != 200:
+                    body = await resp.aread()
+                    return prompt, f"Error: Server returned status {resp.status_code} - {body.decode(errors='replace')}", {}
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    t = time.perf_counter()
+                    chunk = json.loads(line)
+                    tracer.accumulate("json decode", (time.perf_counter() - t) * 1e6)
+                    if chunk.get("error"):
+                        return prompt, f"Error: {chunk['error']}", {}
+                    if chunk.get("done"):
+                        tracer.server_timings(chunk)
+                        stats = {k: v for k, v in chunk.items() if k.endswith("_duration") or k.endswith("_count")}
+                        break
+                    tracer.token()
+                    if recorder and first_token is None:
+                        first_token = recorder.now()
+                    parts.append(chunk.get("message", {}).get("content", ""))
+        return prompt, "".join(parts), stats
     except Exception as e:
-        return prompt, f"Error: {str(e)}"
-
-async def batch_process(prompts_file, output_file):
-    """Process multiple prompts concurrently."""
-    client = AsyncOpenAI(
-        base_url="http://localhost:11434/v1",
-        api_key="ollama"
-    )
-    
+        return prompt, f"Error: {str(e)}", {}
+    finally:
+        if recorder:
+            recorder.record("/api/chat", payload, sent, first_token, recorder.now(), stats, status)
+
+def report_residency(warm, cold, groups, records, resident, capacity, results):
+    """Print loads performed vs. the input-order estimate and the load time saved."""
+    load_s = {}
+    for model, idxs in groups.items():
+        measured = [results[i][2].get("load_duration", 0) for i in idxs]
+        if measured and max(measured) > LOAD_THRESHOLD_NS:
+            load_s[model] = max(measured) / 1e9
+    naive = count_naive_loads([r["model"] for r in records], resident, capacity)
+    planned = {m: 1 for m in cold}
+    avoided = {m: naive.get(m, 0) - planned.get(m, 0) for m in groups}
+    mean_load = sum(load_s.values()) / len(load_s) if load_s else None
+
+    print(f"Residency plan: {len(groups)} model(s); resident at start (LRU first): {resident or 'none'}")
+    print(f"  drained first (resident): {warm or 'none'}")
+    print(f"  loaded once each, in order: {cold or 'none'}")
+    print(f"  loads: {len(cold)} planned vs ~{sum(naive.values())} in input order (max {capacity} loaded)")
+    saved = 0.0
+    for model in groups:
+        if avoided[model] <= 0:
+            continue
+        per_load = load_s.get(model, mean_load)
+        if per_load is None:
+            print(f"  {model}: avoided ~{avoided[model]} load(s)")
+            continue
+        saved += avoided[model] * per_load
+        print(f"  {model}: avoided ~{avoided[model]} load(s) × {per_load:.1f}s")
+    if saved:
+        print(f"  estimated load time avoided: ~{saved:.1f}s")
+
+async def batch_process(prompts_file, output_file, model="gpt-oss:120b",
+                        ollama_url="http://localhost:11434", concurrency=5, tracer=None,
+                        keep_alive="30m", max_loaded=3, recorder=None):
+    """Process multiple prompts concurrently, grouped by model to avoid reloads."""
+    tracer = tracer or Tracer(enabled=False)
+    client = httpx.AsyncClient(base_url=ollama_url, timeout=httpx.Timeout(600, connect=10))
+
     # Read prompts
     async with aiofiles.open(prompts_file, 'r') as f:
-        prompts = [line.strip() for line in await f.readlines()]
-    
+        records = read_records(await f.readlines(), prompts_file.endswith(".jsonl"), model)
+
     # Process concurrently (limit concurrent requests)
-    semaphore = asyncio.Semaphore(5)  # Max 5 concurrent requests
-    
-    async def limited_process(prompt):
-        async with semaphore:
-            return await process_prompt(client, prompt)
-    
-    results = await asyncio.gather(*[limited_process(p) for p in prompts])
-    
-    # Write results
-    async with aiofiles.open(output_file, 'w') as f:
-        for prompt, response in results:
-            await f.write(f"Prompt: {prompt}\n")
-            await f.write(f"Response: {response}\n")
-            await f.write("-" * 50 + "\n")
+    semaphore = asyncio.Semaphore(concurrency)  # Max concurrent requests
+    results = [None] * len(records)
+
+    async def limited_process(i, alive):
+        rec = records[i]
+        with tracer.request(f"prompt {i}", prompt=rec["prompt"][:80], model=rec["model"]):
+            queued = tracer.now()
+            async with semaphore:
+                tracer.add_span("queue", queued, tracer.now())
+                results[i] = await process_prompt(client, rec["prompt"], rec["model"], tracer, alive, recorder)
+
+    try:
+        resident = await fetch_resident_models(client)
+        warm, cold, groups = plan_groups(records, resident)
+
+        # Resident models can share the GPU, so drain them together first.
+        await asyncio.gather(*[limited_process(i, keep_alive) for m in warm for i in groups[m]])
+
+        # Then one cold model at a time. A model this batch loaded is released
+        # on its last request only if the next load would otherwise go over
+        # max_loaded, so that load doesn't evict a model someone else was
+        # already using; models that still fit stay resident.
+        loaded = len(resident)
+        for n, m in enumerate(cold):
+            idxs = groups[m]
+            loaded += 1
+            release = n < len(cold) - 1 and loaded + 1 > max_loaded
+            if release:
+                loaded -= 1
+            await asyncio.gather(*[
+                limited_process(i, 0 if release and i == idxs[-1] else keep_alive) for i in idxs
+            ])
+        if len(groups) > 1:
+            report_residency(warm, cold, groups, records, resident, max_loaded, results)
+    finally:
+        await client.aclose()
+
+    # Write results (input order)
+    with tracer.span("write results"):
+        async with aiofiles.open(output_file, 'w') as f:
+            for prompt, response, _ in results:
+                await f.write(f"Prompt: {prompt}\n")
+                await f.write(f"Response: {response}\n")
+                await f.write("-" * 50 + "\n")
+
+def _positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be > 0, got {value}")
+    return number
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch prompts against an Ollama server")
+    parser.add_argument("--prompts", type=str, default="prompts.txt", help="Input file, one prompt per line, or .jsonl records with 'prompt' and optional 'model' (default: prompts.txt)")
+    parser.add_argument("--output", type=str, default="responses.txt", help="Output file (default: responses.txt)")
+    parser.add_argument("--model", type=str, default="gpt-oss:120b", help="Model tag for records without one (default: gpt-oss:120b)")
+    parser.add_argument("--concurrency", type=_positive_int, default=5, help="Max concurrent requests (default: 5)")
+    parser.add_argument("--ollama-url", type=str, default="http://localhost:11434", help="Ollama API URL (default: http://localhost:11434)")
+    parser.add_argument("--keep-alive", type=str, default=os.getenv("OLLAMA_KEEP_ALIVE", "30m"), help="keep_alive sent with each request (default: $OLLAMA_KEEP_ALIVE or 30m)")
+    parser.add_argument("--max-loaded", type=int, default=int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "3")), help="Server's OLLAMA_MAX_LOADED_MODELS, for the reload estimate (default: env or 3)")
+    parser.add_argument("--trace", type=str, default=None, help="Write a Chrome trace / Perfetto JSON here and print a timing summary")
+    parser.add_argument("--record", type=str, default=None, help="Record request arrivals, shapes and token counts here for ollama_replay.py (.gz to compress)")
+    parser.add_argument("--redact", action="store_true", help="With --record, keep prompt lengths only, not content")
+    args = parser.parse_args(argv)
+
+    tracer = Tracer(enabled=bool(args.trace))
+    recorder = None
+    if args.record:
+        from ollama_replay import Recorder  # only needed when recording
+        recorder = Recorder(args.record, redact=args.redact, source="batch")
+    try:
+        asyncio.run(batch_process(args.prompts, args.output, args.model, args.ollama_url, args.concurrency, tracer,
+                                  args.keep_alive, args.max_loaded, recorder))
+    finally:
+        if recorder:
+            recorder.close()
+    if args.trace:
+        tracer.export_chrome(args.trace)
+        print(tracer.summary())
+        print(f"Trace written to {args.trace} (open in chrome://tracing or https://ui.perfetto.dev)")
 
 if __name__ == "__main__":
-    asyncio.run(batch_process("prompts.txt", "responses.txt"))
+    main()
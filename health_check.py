@@ -1,46 +1,72 @@
 #!/usr/bin/env python3
 # health_check.py
+# Standard library only, so a health probe doesn't pay for third-party imports.
 
-import requests
-import time
+import argparse
+import json
+import urllib.error
+import urllib.request
 from datetime import datetime
 
-def check_ollama_health():
-    """Check if Ollama services are healthy."""
+def _request(url, payload=None, timeout=5):
+    """GET (or POST payload as JSON) and return the HTTP status code."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def check_ollama_health(ollama_url="http://localhost:11434", model="gpt-oss:120b"):
+    """Check if Ollama services are healthy; return True if all checks pass."""
+    healthy = True
     checks = {
-        "Ollama API": "http://localhost:11434/api/tags",
-        "OpenAI Compatibility": "http://localhost:11434/v1/models"
+        "Ollama API": f"{ollama_url}/api/tags",
+        "OpenAI Compatibility": f"{ollama_url}/v1/models"
     }
-    
+
     for service, url in checks.items():
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
+            status = _request(url, timeout=5)
+            if status == 200:
                 print(f"✅ {service}: Healthy")
             else:
-                print(f"⚠️ {service}: Status {response.status_code}")
-        except requests.exceptions.RequestException as e:
+                healthy = False
+                print(f"⚠️ {service}: Status {status}")
+        except (urllib.error.URLError, OSError) as e:
+            healthy = False
             print(f"❌ {service}: {str(e)}")
-    
+
     # Test model responsiveness
     try:
-        response = requests.post(
-            "http://localhost:11434/v1/chat/completions",
-            json={
-                "model": "gpt-oss:120b",
+        status = _request(
+            f"{ollama_url}/v1/chat/completions",
+            {
+                "model": model,
                 "messages": [{"role": "user", "content": "test"}],
                 "max_tokens": 1
             },
             timeout=10
         )
-        if response.status_code == 200:
+        if status == 200:
             print(f"✅ Model Response: Working")
         else:
-            print(f"⚠️ Model Response: Status {response.status_code}")
+            healthy = False
+            print(f"⚠️ Model Response: Status {status}")
     except Exception as e:
+        healthy = False
         print(f"❌ Model Response: {str(e)}")
+    return healthy
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ollama health check")
+    parser.add_argument("--ollama-url", type=str, default="http://localhost:11434", help="Ollama API URL (default: http://localhost:11434)")
+    parser.add_argument("--model", type=str, default="gpt-oss:120b", help="Model used for the response check (default: gpt-oss:120b)")
+    args = parser.parse_args(argv)
     print(f"Health Check - {datetime.now()}")
     print("-" * 40)
-    check_ollama_health()
+    return 0 if check_ollama_health(args.ollama_url, args.model) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
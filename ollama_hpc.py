@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# ollama_hpc.py
+# Single entry point for the tools in this repo. Each subcommand imports only
+# what it needs, so `health` or `pull` in a SLURM step or probe doesn't pay for
+# gradio / openai / litellm imports.
+#
+# Usage:
+#   python ollama_hpc.py health [--ollama-url URL] [--model TAG]
+#   python ollama_hpc.py batch  [--prompts FILE] [--model TAG] ...   (see batch_process.py)
+#   python ollama_hpc.py chat   [--port 7860] ...                    (see ollama_web.py)
+#   python ollama_hpc.py pull   gpt-oss:latest
+#   python ollama_hpc.py bench  [--max-ms 150]                        # startup-time guard
+#
+# Keep this module's top-level imports to the standard library: they are paid
+# by every subcommand.
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+# Subcommands implemented by an existing script's main(argv)
+SCRIPT_COMMANDS = {
+    "chat": ("ollama_web", "Gradio chat UI (imports gradio)"),
+    "batch": ("batch_process", "Concurrent batch prompts against Ollama"),
+    "health": ("health_check", "Check the Ollama API, /v1 and model response"),
+}
+
+# Imports each subcommand pays before it can do any work; `bench` times these
+# rather than `<command> --help`, which would skip lazily imported modules.
+BENCH_IMPORTS = {
+    "health": "import health_check, urllib.request",
+    "batch": "import batch_process, asyncio, httpx, aiofiles",
+    "pull": "import urllib.request, json",
+}
+
+def pull(argv=None):
+    """Pull a model through the Ollama API (/api/pull), printing progress."""
+    import urllib.error
+    import urllib.request
+
+    parser = argparse.ArgumentParser(prog="ollama_hpc.py pull", description="Pull a model via the Ollama API")
+    parser.add_argument("model", type=str, help="Model tag to pull, e.g. gpt-oss:latest")
+    parser.add_argument("--ollama-url", type=str, default=os.getenv("OLLAMA_URL", "http://localhost:11434"), help="Ollama API URL (default: $OLLAMA_URL or http://localhost:11434)")
+    args = parser.parse_args(argv)
+
+    req = urllib.request.Request(
+        f"{args.ollama_url}/api/pull",
+        data=json.dumps({"model": args.model, "stream": True}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    status = ""
+    try:
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            for line in resp:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    print(f"\n❌ Pull failed: {chunk['error']}")
+                    return 1
+                status = chunk.get("status", status)
+                if chunk.get("total"):
+                    pct = 100.0 * chunk.get("completed", 0) / chunk["total"]
+                    print(f"\r{status}: {pct:5.1f}%", end="", flush=True)
+                else:
+                    print(f"\r{status}".ljust(60), end="", flush=True)
+    except urllib.error.HTTPError as e:
+        # Ollama puts the reason in a JSON {"error": ...} body
+        detail = e.read().decode(errors="replace").strip()
+        print(("\n" if status else "") + f"❌ Pull failed: HTTP {e.code} {detail}".rstrip())
+        return 1
+    except (urllib.error.URLError, OSError) as e:
+        print(("\n" if status else "") + f"❌ Pull failed: {e}")
+        return 1
+    print()
+    if status != "success":
+        print(f"⚠ Pull ended with status '{status}'")
+        return 1
+    print(f"✅ Pulled '{args.model}'")
+    return 0
+
+def _time_command(cmd, repeats):
+    """Median wall time (ms) to run cmd in a fresh interpreter, and its exit code."""
+    import subprocess
+
+    samples = []
+    returncode = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, text=True, check=False)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        if proc.returncode != 0:
+            print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}")
+            return None, proc.returncode
+    samples.sort()
+    return samples[len(samples) // 2], returncode
+
+def bench(argv=None):
+    """Measure the import cost of subcommands and fail if any exceeds the budget."""
+    parser = argparse.ArgumentParser(prog="ollama_hpc.py bench", description="Startup-time benchmark for ollama_hpc.py subcommands")
+    parser.add_argument("commands", nargs="*", default=list(BENCH_IMPORTS), help=f"Subcommands to time (default: {' '.join(BENCH_IMPORTS)})")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per command; the median is reported (default: 5)")
+    parser.add_argument("--max-ms", type=float, default=150.0, help="Budget per command above bare interpreter startup (default: 150)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.commands if name not in BENCH_IMPORTS]
+    if unknown:
+        parser.error(f"cannot bench {', '.join(unknown)} (choose from {', '.join(BENCH_IMPORTS)})")
+
+    # Import exactly what the command needs in a fresh interpreter; no server
+    # is contacted. A missing dependency fails the check.
+    baseline, _ = _time_command([sys.executable, "-c", "pass"], args.repeats)
+    print(f"{'python -c pass':<22}{baseline:>9.1f} ms")
+    failed = []
+    for name in args.commands:
+        ms, returncode = _time_command([sys.executable, "-c", BENCH_IMPORTS[name]], args.repeats)
+        if returncode != 0:
+            failed.append(name)
+            print(f"{name:<22}{'failed':>9}     ❌ {BENCH_IMPORTS[name]!r} exited {returncode}")
+            continue
+        over = ms - baseline
+        ok = over <= args.max_ms
+        if not ok:
+            failed.append(name)
+        print(f"{name:<22}{ms:>9.1f} ms  (+{over:.1f} ms) {'✅' if ok else '❌ over ' + str(args.max_ms) + ' ms'}")
+    if failed:
+        print(f"Startup check failed for: {', '.join(failed)}. Install missing dependencies, or look for heavy imports with python -X importtime.")
+        return 1
+    return 0
+
+LOCAL_COMMANDS = {
+    "pull": (pull, "Pull a model via the Ollama API (no ollama binary needed)"),
+    "bench": (bench, "Startup-time benchmark of each subcommand's imports"),
+}
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = {name: help_text for name, (_, help_text) in {**SCRIPT_COMMANDS, **LOCAL_COMMANDS}.items()}
+    parser = argparse.ArgumentParser(
+        prog="ollama_hpc.py",
+        description="Ollama on HPC: chat UI, batch, health, pull and startup bench",
+        epilog="commands:\n" + "\n".join(f"  {name:<8}{text}" for name, text in commands.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=list(commands), help="Subcommand; run '<command> --help' for its options")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command in LOCAL_COMMANDS:
+        return LOCAL_COMMANDS[args.command][0](args.args)
+    module = importlib.import_module(SCRIPT_COMMANDS[args.command][0])
+    return module.main(args.args)
+
+if __name__ == "__main__":
+    sys.exit(main())
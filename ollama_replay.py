@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# ollama_replay.py
+# Record/replay of Ollama traffic for reproducible performance testing.
+#
+# Record (from the clients in this repo):
+#   python batch_process.py --record traffic.jsonl [--redact]
+#   python ollama_web.py --record traffic.jsonl [--redact]
+#
+# Replay against any Ollama endpoint, at recorded or scaled speed:
+#   python ollama_replay.py replay traffic.jsonl --url http://localhost:11434 --speed 2
+#
+# Stand-in server that streams tokens at the recorded rates (no GPU needed):
+#   python ollama_replay.py serve --port 11500 --parallel 4 --max-loaded 3 --load-time 20
+#   python ollama_replay.py replay traffic.jsonl --url http://localhost:11500
+
+import argparse
+import asyncio
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+
+TRACE_VERSION = 1
+
+# Sent by the replayer so the stand-in server can reproduce recorded timing;
+# a real Ollama server ignores them.
+TTFT_HEADER = "X-Replay-TTFT"
+TPS_HEADER = "X-Replay-TPS"
+
+# Top-level request fields that shape server behaviour and are replayed as-is:
+# keep_alive drives model residency, and ollama_web.py sends temperature here
+# rather than under options.
+PASSTHROUGH_FIELDS = ("keep_alive", "temperature")
+
+
+def _open(path: str, mode: str):
+    return gzip.open(path, mode + "t") if path.endswith(".gz") else open(path, mode)
+
+
+def _prompt_text(payload: Dict[str, Any]) -> str:
+    if "messages" in payload:
+        return "".join(str(m.get("content", "")) for m in payload["messages"])
+    return str(payload.get("prompt", ""))
+
+
+class Recorder:
+    """Appends one JSON line per request to a (optionally .gz) trace file.
+
+    With redact=True only the shape of each request is kept (model, message
+    count, prompt length, options, keep_alive), never its content.
+    """
+
+    def __init__(self, path: Optional[str] = None, redact: bool = False, source: str = "client"):
+        self.enabled = bool(path)
+        self.redact = redact
+        self.source = source
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file = None
+        if self.enabled:
+            self._file = _open(path, "w")
+            self._write({"version": TRACE_VERSION, "started": time.time(), "source": source, "redacted": redact})
+
+    def now(self) -> float:
+        """Seconds since the recorder was created."""
+        return time.perf_counter() - self._t0
+
+    def _write(self, obj: Dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(obj, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def record(self, endpoint: str, payload: Dict[str, Any], sent: float,
+               first_token: Optional[float] = None, done: Optional[float] = None,
+               stats: Optional[Dict[str, Any]] = None, status: int = 200) -> None:
+        """Record one request; sent/first_token/done are now() readings."""
+        if not self.enabled:
+            return
+        stats = stats or {}
+        rec = {
+            "t": round(sent, 4),
+            "src": self.source,
+            "ep": endpoint,
+            "model": payload.get("model"),
+            "stream": payload.get("stream", True),
+            "msgs": len(payload.get("messages", [])) or 1,
+            "chars": len(_prompt_text(payload)),
+            "status": status,
+        }
+        if payload.get("options"):
+            rec["options"] = payload["options"]
+        for key in PASSTHROUGH_FIELDS:
+            if key in payload:
+                rec[key] = payload[key]
+        if not self.redact:
+            for key in ("messages", "prompt"):
+                if key in payload:
+                    rec[key] = payload[key]
+        if "prompt_eval_count" in stats:
+            rec["prompt_tokens"] = stats["prompt_eval_count"]
+        if "eval_count" in stats:
+            rec["gen_tokens"] = stats["eval_count"]
+        if first_token is not None:
+            rec["ttft"] = round(first_token - sent, 4)
+        if done is not None:
+            rec["dur"] = round(done - sent, 4)
+        for key in ("load_duration", "prompt_eval_duration", "eval_duration"):
+            if key in stats:
+                rec[key[: -len("_duration")]] = round(stats[key] / 1e9, 4)
+        self._write(rec)
+
+    def close(self) -> None:
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
+            self._file = None
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """Return the request records of a trace file, sorted by arrival time."""
+    with _open(path, "r") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    return sorted((r for r in lines if "ep" in r), key=lambda r: r["t"])
+
+
+def _tokens_per_second(rec: Dict[str, Any]) -> Optional[float]:
+    if rec.get("gen_tokens") and rec.get("eval"):
+        return rec["gen_tokens"] / rec["eval"]
+    if rec.get("gen_tokens") and rec.get("dur") and rec.get("ttft") is not None and rec["dur"] > rec["ttft"]:
+        return rec["gen_tokens"] / (rec["dur"] - rec["ttft"])
+    return None
+
+
+def build_request(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild a request payload from a record, synthesizing redacted content."""
+    filler = ("lorem " * (rec.get("chars", 0) // 6 + 1))[: rec.get("chars", 0)]
+    payload: Dict[str, Any] = {"model": rec["model"], "stream": rec.get("stream", True)}
+    if rec["ep"].endswith("/chat"):
+        payload["messages"] = rec.get("messages") or [{"role": "user", "content": filler}]
+    else:
+        payload["prompt"] = rec.get("prompt", filler)
+    for key in PASSTHROUGH_FIELDS:
+        if key in rec:
+            payload[key] = rec[key]
+    options = dict(rec.get("options") or {})
+    if rec.get("gen_tokens"):
+        options["num_predict"] = rec["gen_tokens"]  # reproduce the recorded output length
+    if options:
+        payload["options"] = options
+    return payload
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+async def replay(records: List[Dict[str, Any]], url: str, speed: float = 1.0, tracer=None) -> List[Dict[str, Any]]:
+    """Re-issue recorded requests at their recorded offsets divided by speed (> 0)."""
+    if speed <= 0:
+        raise ValueError(f"speed must be > 0, got {speed}")
+    import httpx  # only the replayer needs it; the stand-in server is stdlib-only
+
+    results: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    base = records[0]["t"] if records else 0.0
+
+    async def one(i: int, rec: Dict[str, Any]) -> None:
+        delay = (rec["t"] - base) / speed - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        headers = {}
+        if rec.get("ttft") is not None:
+            # The stand-in simulates loads itself, so don't replay the recorded one.
+            headers[TTFT_HEADER] = str(max(0.0, rec["ttft"] - rec.get("load", 0.0)))
+        tps = _tokens_per_second(rec)
+        if tps:
+            headers[TPS_HEADER] = f"{tps:.3f}"
+        sent = time.perf_counter()
+        first = None
+        status = 0
+        error = None
+        lane = tracer.begin_request(f"replay {i}", model=rec["model"]) if tracer else 0
+        try:
+            async with client.stream("POST", rec["ep"], json=build_request(rec), headers=headers) as resp:
+                status = resp.status_code
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    if first is None:
+                        first = time.perf_counter()
+                    chunk = json.loads(line)
+                    if tracer:
+                        if chunk.get("done"):
+                            tracer.server_timings(chunk, lane)
+                        else:
+                            tracer.token(lane)
+        except httpx.HTTPError as e:
+            error = f"{e.__class__.__name__}: {e}"
+        except ValueError as e:
+            # A malformed line fails this request only, not the whole replay
+            error = f"bad response line: {e}"
+        finally:
+            if tracer:
+                tracer.end_request(lane, status=status)
+        done = time.perf_counter()
+        if error:
+            print(f"⚠ request {i} failed: {error}")
+        results.append({
+            "i": i,
+            "status": status,
+            "error": error,
+            "lag": round(sent - start - (rec["t"] - base) / speed, 4),
+            "ttft": round(first - sent, 4) if first else None,
+            "dur": round(done - sent, 4),
+            "recorded_ttft": rec.get("ttft"),
+            "recorded_dur": rec.get("dur"),
+        })
+
+    async with httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(600, connect=10)) as client:
+        await asyncio.gather(*[one(i, r) for i, r in enumerate(records)])
+    return sorted(results, key=lambda r: r["i"])
+
+
+def replay_summary(results: List[Dict[str, Any]]) -> str:
+    ok = [r for r in results if r["status"] == 200 and not r["error"]]
+    lines = [f"Replayed {len(results)} requests ({len(results) - len(ok)} failed)"]
+    for key in ("ttft", "dur"):
+        now = [r[key] for r in ok if r[key] is not None]
+        then = [r[f"recorded_{key}"] for r in ok if r[f"recorded_{key}"] is not None]
+        lines.append(
+            f"  {key:<5} replay mean {sum(now) / max(1, len(now)):.3f}s p95 {_percentile(now, 95):.3f}s"
+            f" | recorded mean {sum(then) / max(1, len(then)):.3f}s p95 {_percentile(then, 95):.3f}s"
+        )
+    lags = [r["lag"] for r in results]
+    lines.append(f"  dispatch lag max {max(lags, default=0.0) * 1000:.1f} ms")
+    return "\n".join(lines)
+
+
+# --- Stand-in server -----------------------------------------------------------
+
+class StandInState:
+    """Model residency and parallelism of the simulated server."""
+
+    def __init__(self, parallel: int, max_loaded: int, load_time: float):
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.max_loaded = max_loaded
+        self.load_time = load_time
+        self.cond = threading.Condition()
+        self.loaded: List[str] = []  # least recently used first
+        self.known: List[str] = []
+        self.ready: Dict[str, float] = {}  # perf_counter() time each load finishes
+        self.refs: Dict[str, int] = {}  # in-flight requests per model
+        self.unload_when_idle: Set[str] = set()  # models that got keep_alive 0
+
+    def acquire_model(self, model: str, keep_alive: Any = None) -> float:
+        """Reference model, loading it if needed, and return seconds until it is ready.
+
+        Requests arriving while a model is loading wait for the same load, like
+        Ollama does. Eviction is LRU over models no request is using; if every
+        resident model is busy, the load waits for one to go idle.
+        """
+        with self.cond:
+            if model not in self.known:
+                self.known.append(model)
+            if keep_alive in (0, "0", "0s", "0m"):
+                self.unload_when_idle.add(model)
+            else:
+                self.unload_when_idle.discard(model)
+            if model not in self.loaded:
+                while len(self.loaded) >= self.max_loaded:
+                    idle = [m for m in self.loaded if not self.refs.get(m)]
+                    if idle:
+                        self.loaded.remove(idle[0])
+                        self.ready.pop(idle[0], None)
+                    else:
+                        self.cond.wait()
+                self.ready[model] = time.perf_counter() + self.load_time
+            else:
+                self.loaded.remove(model)
+            self.loaded.append(model)
+            self.refs[model] = self.refs.get(model, 0) + 1
+            return max(0.0, self.ready[model] - time.perf_counter())
+
+    def release_model(self, model: str) -> None:
+        """Drop one reference; unload now if the model was sent keep_alive 0."""
+        with self.cond:
+            self.refs[model] -= 1
+            if not self.refs[model] and model in self.unload_when_idle and model in self.loaded:
+                self.loaded.remove(model)
+                self.ready.pop(model, None)
+                self.unload_when_idle.discard(model)
+            self.cond.notify_all()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Streams synthetic tokens shaped like Ollama's /api/generate and /api/chat."""
+
+    state: StandInState = None  # set by serve()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, obj: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/ps":
+            with self.state.cond:
+                loaded = list(self.state.loaded)
+            self._json({"models": [{"name": m, "model": m} for m in loaded]})
+        elif self.path == "/api/tags":
+            self._json({"models": [{"name": m, "model": m} for m in self.state.known]})
+        elif self.path == "/v1/models":
+            self._json({"object": "list", "data": [{"id": m, "object": "model"} for m in self.state.known]})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._json({"error": "not found"}, 404)
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = payload.get("model", "stand-in")
+        n_tokens = int((payload.get("options") or {}).get("num_predict") or 128)
+        ttft = float(self.headers.get(TTFT_HEADER, 0.2))
+        tps = float(self.headers.get(TPS_HEADER, 30.0))
+        chat = self.path == "/api/chat"
+        started = time.perf_counter()
+
+        with self.state.slots:
+            # Seconds until the model is loaded: load_time for a cold model,
+            # the rest of an in-progress load, or 0 once it is resident.
+            load = self.state.acquire_model(model, payload.get("keep_alive"))
+            try:
+                time.sleep(load + ttft)
+                prompt_eval = ttft
+                stream = payload.get("stream", True)
+                if stream:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.end_headers()
+                eval_start = time.perf_counter()
+                for i in range(n_tokens):
+                    if i:
+                        time.sleep(1.0 / tps)
+                    if stream:
+                        piece = {"message": {"role": "assistant", "content": "tok "}} if chat else {"response": "tok "}
+                        self.wfile.write((json.dumps({"model": model, "done": False, **piece}) + "\n").encode())
+                        self.wfile.flush()
+                eval_s = time.perf_counter() - eval_start
+            finally:
+                self.state.release_model(model)
+
+        final = {
+            "model": model,
+            "done": True,
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": len(_prompt_text(payload)) // 4,
+            "prompt_eval_duration": int(prompt_eval * 1e9),
+            "eval_count": n_tokens,
+            "eval_duration": int(eval_s * 1e9),
+        }
+        if stream:
+            self.wfile.write((json.dumps(final) + "\n").encode())
+        else:
+            text = "tok " * n_tokens
+            final.update({"message": {"role": "assistant", "content": text}} if chat else {"response": text})
+            self._json(final)
+
+
+def serve(host: str, port: int, parallel: int, max_loaded: int, load_time: float) -> None:
+    StandInHandler.state = StandInState(parallel, max_loaded, load_time)
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    print(f"Stand-in Ollama on http://{host}:{port} (parallel={parallel}, max_loaded={max_loaded}, load_time={load_time}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _positive_float(value: str) -> float:
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be > 0, got {value}")
+    return number
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record/replay Ollama traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_replay = sub.add_parser("replay", help="Re-issue a recorded trace against an endpoint")
+    p_replay.add_argument("trace", type=str, help="Trace file written with --record (.jsonl or .jsonl.gz)")
+    p_replay.add_argument("--url", type=str, default="http://localhost:11434", help="Target Ollama URL (default: http://localhost:11434)")
+    p_replay.add_argument("--speed", type=_positive_float, default=1.0, help="Arrival-time scale; 2 replays twice as fast (default: 1.0)")
+    p_replay.add_argument("--trace-out", type=str, default=None, help="Also write a Chrome trace of the replay (see ollama_trace.py)")
+
+    p_serve = sub.add_parser("serve", help="Run a stand-in server that emits tokens at recorded rates")
+    p_serve.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind (default: 127.0.0.1)")
+    p_serve.add_argument("--port", type=int, default=11500, help="Port to bind (default: 11500)")
+    p_serve.add_argument("--parallel", type=int, default=4, help="Concurrent generations, like OLLAMA_NUM_PARALLEL (default: 4)")
+    p_serve.add_argument("--max-loaded", type=int, default=3, help="Resident models, like OLLAMA_MAX_LOADED_MODELS (default: 3)")
+    p_serve.add_argument("--load-time", type=float, default=0.0, help="Simulated seconds to load a non-resident model (default: 0)")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.host, args.port, args.parallel, args.max_loaded, args.load_time)
+    else:
+        tracer = None
+        if args.trace_out:
+            from ollama_trace import Tracer
+            tracer = Tracer()
+        results = asyncio.run(replay(load_trace(args.trace), args.url, args.speed, tracer))
+        print(replay_summary(results))
+        if tracer:
+            tracer.export_chrome(args.trace_out)
+            print(tracer.summary())
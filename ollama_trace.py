@@ -0,0 +1,263 @@
+# ollama_trace.py
+# Opt-in client-side tracing for the Ollama clients in this repo.
+#
+# Records spans and per-token arrival times per request, merges in the
+# durations Ollama reports on its final chunk (load / prompt eval / eval),
+# and exports Chrome trace JSON that opens in chrome://tracing or
+# https://ui.perfetto.dev.
+#
+# Usage:
+#   tracer = Tracer()
+#   with tracer.request("prompt 1"):
+#       with tracer.span("http"):
+#           ...
+#           tracer.token()
+#       tracer.server_timings(final_chunk)
+#   tracer.export_chrome("trace.json")
+#   print(tracer.summary())
+
+import contextvars
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Durations (in ns) that Ollama puts on the final chunk of /api/generate and /api/chat.
+SERVER_DURATIONS = ("load_duration", "prompt_eval_duration", "eval_duration")
+SERVER_COUNTS = ("prompt_eval_count", "eval_count")
+
+CLIENT_PID = 1
+SERVER_PID = 2
+
+# Lane (Chrome trace thread id) of the request currently being traced.
+_current_lane: contextvars.ContextVar[int] = contextvars.ContextVar("ollama_trace_lane", default=0)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class Tracer:
+    """Collects trace events; every method is a no-op when enabled is False."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._t0 = time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._lanes = itertools.count(1)
+        self._events: List[Dict[str, Any]] = []
+        self._requests: Dict[int, Dict[str, Any]] = {}
+        self._phases: Dict[str, float] = {}  # time spent outside any request (e.g. writing results)
+
+    # ---- clock -------------------------------------------------------------
+    def now(self) -> float:
+        """Microseconds since the tracer was created (Chrome trace time base)."""
+        return (time.perf_counter_ns() - self._t0) / 1000.0
+
+    def _lane(self, lane: Optional[int]) -> int:
+        return lane if lane is not None else _current_lane.get()
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self._events.append(event)
+
+    # ---- requests ----------------------------------------------------------
+    def begin_request(self, label: str, **args) -> int:
+        """Open a lane for one request and return its id.
+
+        Use this (with end_request) from generators, which may be resumed in a
+        different thread/context; otherwise prefer the request() context manager.
+        """
+        if not self.enabled:
+            return 0
+        lane = next(self._lanes)
+        with self._lock:
+            self._requests[lane] = {
+                "label": label,
+                "start": self.now(),
+                "end": None,
+                "args": dict(args),
+                "phases": {},
+                "tokens": [],
+                "server": {},
+            }
+        self._emit({"ph": "M", "name": "thread_name", "pid": CLIENT_PID, "tid": lane, "args": {"name": label}})
+        self._emit({"ph": "M", "name": "thread_name", "pid": SERVER_PID, "tid": lane, "args": {"name": label}})
+        return lane
+
+    def end_request(self, lane: int, **args) -> None:
+        if not self.enabled or lane not in self._requests:
+            return
+        rec = self._requests[lane]
+        rec["end"] = self.now()
+        rec["args"].update(args)
+        self._emit({
+            "ph": "X", "name": "request", "cat": "client", "pid": CLIENT_PID, "tid": lane,
+            "ts": rec["start"], "dur": rec["end"] - rec["start"], "args": rec["args"],
+        })
+
+    @contextmanager
+    def request(self, label: str, **args):
+        """Trace one request; spans and tokens inside the block land on its lane."""
+        lane = self.begin_request(label, **args)
+        token = _current_lane.set(lane)
+        try:
+            yield lane
+        finally:
+            _current_lane.reset(token)
+            self.end_request(lane)
+
+    # ---- spans -------------------------------------------------------------
+    def add_span(self, name: str, start: float, end: float, lane: Optional[int] = None, **args) -> None:
+        """Record a span from explicit start/end times (as returned by now())."""
+        if not self.enabled:
+            return
+        lane = self._lane(lane)
+        self._emit({
+            "ph": "X", "name": name, "cat": "client", "pid": CLIENT_PID, "tid": lane,
+            "ts": start, "dur": max(0.0, end - start), "args": args,
+        })
+        self.accumulate(name, end - start, lane)
+
+    @contextmanager
+    def span(self, name: str, lane: Optional[int] = None, **args):
+        if not self.enabled:
+            yield
+            return
+        lane = self._lane(lane)
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, self.now(), lane, **args)
+
+    def accumulate(self, phase: str, duration_us: float, lane: Optional[int] = None) -> None:
+        """Add time to a per-request phase without emitting an event.
+
+        For work that happens once per token (JSON decoding, UI rendering),
+        where one span per occurrence would swamp the trace.
+        """
+        if not self.enabled:
+            return
+        rec = self._requests.get(self._lane(lane))
+        phases = rec["phases"] if rec is not None else self._phases
+        with self._lock:
+            phases[phase] = phases.get(phase, 0.0) + max(0.0, duration_us)
+
+    # ---- tokens & server timings ------------------------------------------
+    def token(self, lane: Optional[int] = None) -> None:
+        """Record the arrival of one streamed token."""
+        if not self.enabled:
+            return
+        lane = self._lane(lane)
+        ts = self.now()
+        rec = self._requests.get(lane)
+        if rec is not None:
+            rec["tokens"].append(ts)
+        self._emit({"ph": "i", "s": "t", "name": "token", "cat": "token", "pid": CLIENT_PID, "tid": lane, "ts": ts})
+
+    def server_timings(self, chunk: Dict[str, Any], lane: Optional[int] = None) -> None:
+        """Merge the durations from Ollama's final (done=true) chunk.
+
+        Ollama only reports durations, not timestamps, so the server spans are
+        laid out back to back and anchored so they end when the final chunk
+        arrived at the client.
+        """
+        if not self.enabled or "total_duration" not in chunk:
+            return
+        lane = self._lane(lane)
+        end = self.now()
+        total = chunk["total_duration"] / 1000.0
+        start = end - total
+        server = {k: chunk[k] for k in ("total_duration",) + SERVER_DURATIONS + SERVER_COUNTS if k in chunk}
+        rec = self._requests.get(lane)
+        if rec is not None:
+            rec["server"] = server
+        self._emit({
+            "ph": "X", "name": "server total", "cat": "server", "pid": SERVER_PID, "tid": lane,
+            "ts": start, "dur": total, "args": server,
+        })
+        cursor = start
+        for key in SERVER_DURATIONS:
+            dur = chunk.get(key, 0) / 1000.0
+            if dur <= 0:
+                continue
+            name = key[: -len("_duration")]
+            self._emit({"ph": "X", "name": name, "cat": "server", "pid": SERVER_PID, "tid": lane, "ts": cursor, "dur": dur})
+            cursor += dur
+
+    # ---- output ------------------------------------------------------------
+    def export_chrome(self, path: str) -> None:
+        """Write Chrome trace / Perfetto JSON."""
+        if not self.enabled:
+            return
+        meta = [
+            {"ph": "M", "name": "process_name", "pid": CLIENT_PID, "args": {"name": "client"}},
+            {"ph": "M", "name": "process_name", "pid": SERVER_PID, "args": {"name": "ollama (server-reported)"}},
+        ]
+        with self._lock:
+            events = meta + list(self._events)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self) -> str:
+        """Per-phase breakdown across all finished requests."""
+        if not self.enabled:
+            return ""
+        with self._lock:
+            done = [r for r in self._requests.values() if r["end"] is not None]
+        if not done:
+            return "Trace summary: no finished requests"
+
+        rows: Dict[str, List[float]] = {}
+
+        def add(name: str, value_ms: float) -> None:
+            rows.setdefault(name, []).append(value_ms)
+
+        ttft, itl, tokens = [], [], 0
+        for rec in done:
+            wall_ms = (rec["end"] - rec["start"]) / 1000.0
+            add("client wall", wall_ms)
+            for phase, us in rec["phases"].items():
+                add(f"client {phase}", us / 1000.0)
+            server = rec["server"]
+            if server:
+                for key in SERVER_DURATIONS:
+                    add(f"server {key[: -len('_duration')]}", server.get(key, 0) / 1e6)
+                # Client-side queueing (e.g. a concurrency semaphore) has its own
+                # row, so keep it out of the overhead that remains for
+                # connection, decode and write costs.
+                queue_ms = rec["phases"].get("queue", 0.0) / 1000.0
+                add("client overhead (wall - queue - server total)",
+                    wall_ms - queue_ms - server["total_duration"] / 1e6)
+            ts = rec["tokens"]
+            tokens += len(ts)
+            if ts:
+                ttft.append((ts[0] - rec["start"]) / 1000.0)
+                itl.extend((b - a) / 1000.0 for a, b in zip(ts, ts[1:]))
+
+        span_s = (max(r["end"] for r in done) - min(r["start"] for r in done)) / 1e6
+        lines = [
+            f"Trace summary: {len(done)} requests in {span_s:.2f}s",
+            f"{'phase':<46}{'total(s)':>10}{'mean(ms)':>11}{'p95(ms)':>11}",
+        ]
+        for name, values in rows.items():
+            lines.append(
+                f"{name:<46}{sum(values) / 1000.0:>10.2f}"
+                f"{sum(values) / len(values):>11.1f}{_percentile(values, 95):>11.1f}"
+            )
+        for name, us in self._phases.items():
+            lines.append(f"{'batch ' + name:<46}{us / 1e6:>10.2f}")
+        if tokens:
+            lines.append(
+                f"tokens: {tokens} streamed, "
+                f"TTFT mean {sum(ttft) / len(ttft):.1f} ms / p95 {_percentile(ttft, 95):.1f} ms, "
+                f"inter-token mean {(sum(itl) / len(itl)) if itl else 0.0:.1f} ms / p95 {_percentile(itl, 95):.1f} ms"
+            )
+        return "\n".join(lines)
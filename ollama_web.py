@@ -8,10 +8,16 @@ import json
 import html
 import time
 import re
+import atexit
+
+from ollama_trace import Tracer
+from ollama_replay import Recorder
 
 class OllamaChat:
-    def __init__(self, ollama_url="http://localhost:11434"):
+    def __init__(self, ollama_url="http://localhost:11434", tracer=None, recorder=None):
         self.base_url = ollama_url
+        self.tracer = tracer or Tracer(enabled=False)
+        self.recorder = recorder or Recorder()
         self.models_dir = os.getenv("OLLAMA_MODELS", "/scratch/qualis/workspace/ollama/models")
         self.session = requests.Session()
         retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
@@ -102,6 +108,12 @@ class OllamaChat:
             return f"Error during model pull: {e}"
 
     def generate_response_stream(self, message, history, model_name, temperature):
+        tracer = self.tracer
+        # Explicit lane: Gradio may resume this generator on a different worker thread.
+        lane = tracer.begin_request(f"chat {model_name}", model=model_name)
+        recorder = self.recorder
+        sent, first_token, status, stats = recorder.now(), None, 0, {}
+        data = {}
         try:
             url = f"{self.base_url}/api/generate"
             data = {
@@ -110,20 +122,38 @@ class OllamaChat:
                 "stream": True,
                 "temperature": float(temperature),
             }
-            resp = self.session.post(url, json=data, stream=True, timeout=100)
-            if resp.status_code == 200:
-                for line in resp.iter_lines():
-                    if line:
-                        chunk = json.loads(line.decode("utf-8"))
-                        decoded = html.unescape(chunk.get("response", ""))
-                        if decoded == "<think>":
-                            yield "Thinking..."
-                        else:
-                            yield decoded
-            else:
-                yield f"Error: Server returned status {resp.status_code} - {resp.text}"
+            with tracer.span("http", lane):
+                resp = self.session.post(url, json=data, stream=True, timeout=100)
+                status = resp.status_code
+                if resp.status_code == 200:
+                    for line in resp.iter_lines():
+                        if line:
+                            t = time.perf_counter()
+                            chunk = json.loads(line.decode("utf-8"))
+                            tracer.accumulate("json decode", (time.perf_counter() - t) * 1e6, lane)
+                            if chunk.get("done"):
+                                tracer.server_timings(chunk, lane)
+                                stats = chunk
+                            else:
+                                tracer.token(lane)
+                                if first_token is None:
+                                    first_token = recorder.now()
+                            decoded = html.unescape(chunk.get("response", ""))
+                            # Time spent suspended here is Gradio consuming/rendering the chunk.
+                            t = time.perf_counter()
+                            if decoded == "<think>":
+                                yield "Thinking..."
+                            else:
+                                yield decoded
+                            tracer.accumulate("ui render", (time.perf_counter() - t) * 1e6, lane)
+                else:
+                    yield f"Error: Server returned status {resp.status_code} - {resp.text}"
         except requests.exceptions.RequestException as e:
             yield f"Error: {e}"
+        finally:
+            tracer.end_request(lane)
+            if data:
+                recorder.record("/api/generate", data, sent, first_token, recorder.now(), stats, status)
 
 def wait_for_models(chat, max_wait=60):
     print("⏳ Waiting for Ollama models to become available...")
@@ -154,8 +184,8 @@ def preload_model(chat, model_name):
     except requests.exceptions.RequestException as e:
         print(f"⚠ Preload failed for '{model_name}': {e}")
 
-def create_interface(ollama_url):
-    chat = OllamaChat(ollama_url)
+def create_interface(ollama_url, tracer=None, recorder=None):
+    chat = OllamaChat(ollama_url, tracer, recorder)
     ENV_DEFAULT = os.getenv("DEFAULT_MODEL", None)
     print(f"DEFAULT_MODEL (env) seen by UI: {ENV_DEFAULT}")
     models = wait_for_models(chat)
@@ -257,13 +287,27 @@ def create_interface(ollama_url):
 
     return iface
 
-if __name__ == "__main__":
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Ollama Web Interface")
     parser.add_argument("--host", type=str, default="0.0.0.0", help="Host to run the server on (default: 0.0.0.0)")
     parser.add_argument("--port", type=int, default=7860, help="Port to run the server on (default: 7860)")
     parser.add_argument("--share", action="store_true", help="Create a public URL (default: False)")
     parser.add_argument("--ollama-url", type=str, default="http://localhost:11434", help="Ollama API URL (default: http://localhost:11434)")
-    args = parser.parse_args()
-    iface = create_interface(args.ollama_url)
+    parser.add_argument("--trace", type=str, default=None, help="Write a Chrome trace / Perfetto JSON of chat requests here on exit")
+    parser.add_argument("--record", type=str, default=None, help="Record chat traffic here for ollama_replay.py (.gz to compress)")
+    parser.add_argument("--redact", action="store_true", help="With --record, keep prompt lengths only, not content")
+    args = parser.parse_args(argv)
+    tracer = Tracer(enabled=bool(args.trace))
+    recorder = Recorder(args.record, redact=args.redact, source="ui")
+    atexit.register(recorder.close)
+    if args.trace:
+        def _dump_trace():
+            tracer.export_chrome(args.trace)
+            print(tracer.summary())
+            print(f"Trace written to {args.trace}")
+        atexit.register(_dump_trace)
+    iface = create_interface(args.ollama_url, tracer, recorder)
     iface.launch(server_name=args.host, server_port=args.port, share=args.share, show_error=True)
 
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,36 @@
 # Requires: openai-agents, litellm, requests
 # Usage:
 #   python openai_agents_with_litellm.py --prompt "What's the weather in Seoul and Tokyo?"
+#   python openai_agents_with_litellm.py --trace agent_trace.json   # Chrome trace + timing summary
+#   python openai_agents_with_litellm.py --prompts questions.txt --output runs.jsonl --concurrency 8
 
 import asyncio
 import argparse
+import json
+import time
 import requests
-from typing import Dict, Any, Optional
-from agents import Agent, Runner, function_tool, set_tracing_disabled
+from typing import Dict, Any, List, Optional
+from agents import Agent, Runner, ToolCallItem, function_tool, set_tracing_disabled
 from agents.extensions.models.litellm_model import LitellmModel
 
+from ollama_trace import Tracer
+
 # Keep Agents internal tracing quiet
 set_tracing_disabled(True)
 
+# Client-side timing trace (ollama_trace); enabled with --trace
+TRACER = Tracer(enabled=False)
+
+class TracedLitellmModel(LitellmModel):
+    """LitellmModel that records each model turn as an "llm" span."""
+
+    async def get_response(self, *args, **kwargs):
+        with TRACER.span("llm", model=self.model):
+            return await super().get_response(*args, **kwargs)
+
+# One pooled HTTP session for the weather tool, shared by all concurrent runs
+_HTTP = requests.Session()
+
 # --- Simple code -> text map for Open-Meteo weather codes ---
 WEATHER_CODE_MAP: Dict[int, str] = {
     0: "Clear", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
@@ -31,7 +50,7 @@ WEATHER_CODE_MAP: Dict[int, str] = {
 
 def _geocode_city(city: str, timeout: int = 10) -> Optional[Dict[str, float]]:
     """Return {'lat': float, 'lon': float, 'name': str, 'country': str} or None."""
-    r = requests.get(
+    r = _HTTP.get(
         "https://geocoding-api.open-meteo.com/v1/search",
         params={"name": city, "count": 1, "language": "en", "format": "json"},
         timeout=timeout,
@@ -50,7 +69,7 @@ def _geocode_city(city: str, timeout: int = 10) -> Optional[Dict[str, float]]:
 
 def _fetch_current_weather(lat: float, lon: float, timeout: int = 10) -> Dict[str, Any]:
     """Return {'temp_c': float|None, 'code': int|None, 'condition': str}."""
-    r = requests.get(
+    r = _HTTP.get(
         "https://api.open-meteo.com/v1/forecast",
         params={
             "latitude": lat,
@@ -72,16 +91,19 @@ def _fetch_current_weather(lat: float, lon: float, timeout: int = 10) -> Dict[st
 
 # --- Tool: get live weather for one city ---
 @function_tool
-def get_weather(city: str) -> Dict[str, Any]:
+async def get_weather(city: str) -> Dict[str, Any]:
     """
     Get current weather for a city (via Open-Meteo).
     Returns a JSON-serializable dict with fields: city, name, country, temp_c, condition, error (optional).
     """
+    # The HTTP calls block, so run them in a worker thread; a sync tool would
+    # stall every other concurrent agent run in --prompts mode.
     try:
-        geo = _geocode_city(city)
-        if not geo:
-            return {"city": city, "error": "city not found"}
-        wx = _fetch_current_weather(geo["lat"], geo["lon"])
+        with TRACER.span("tool get_weather", city=city):
+            geo = await asyncio.to_thread(_geocode_city, city)
+            if not geo:
+                return {"city": city, "error": "city not found"}
+            wx = await asyncio.to_thread(_fetch_current_weather, geo["lat"], geo["lon"])
         return {
             "city": city,
             "name": geo["name"],
@@ -101,9 +123,9 @@ def get_weather(city: str) -> Dict[str, Any]:
 #    """Return a stubbed weather string."""
 #    return f"The weather in {city} is sunny, 22°C."
 
-async def main(prompt: str):
+def build_agent() -> Agent:
     # Point LiteLLM's OpenAI provider at Ollama's OpenAI-compatible endpoint
-    model = LitellmModel(
+    model = TracedLitellmModel(
         model="openai/gpt-oss:latest",    # ensure this tag exists in `curl /api/tags`
         base_url="http://localhost:11434/v1",
         api_key="ollama",
@@ -122,9 +144,69 @@ async def main(prompt: str):
         model=model,
         tools=[get_weather],
     )
+    return agent
+
+def read_prompts(path: str) -> List[str]:
+    """One prompt per line, or .jsonl records with a "prompt" field."""
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip()]
+    if path.endswith(".jsonl"):
+        return [json.loads(line)["prompt"] for line in lines]
+    return lines
 
-    result = await Runner.run(agent, prompt)
-    print(result.final_output)
+async def run_one(agent: Agent, i: int, prompt: str) -> Dict[str, Any]:
+    """Run the agent on one prompt; never raises, errors go in the record."""
+    start = time.perf_counter()
+    record: Dict[str, Any] = {"i": i, "prompt": prompt}
+    try:
+        with TRACER.request(f"agent run {i}", prompt=prompt[:80]):
+            result = await Runner.run(agent, prompt)
+        record["output"] = result.final_output
+        record["tool_calls"] = sum(isinstance(item, ToolCallItem) for item in result.new_items)
+    except Exception as e:
+        record["error"] = f"{e.__class__.__name__}: {e}"
+    record["latency_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+async def run_batch(prompts: List[str], output: str, concurrency: int) -> None:
+    """Run every prompt through one shared agent/model, at most `concurrency` at a time."""
+    agent = build_agent()
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    async def limited(i: int, prompt: str) -> Dict[str, Any]:
+        async with semaphore:
+            record = await run_one(agent, i, prompt)
+        # Written as runs finish so partial results survive an interrupted job
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        print(f"[{i}] {record['latency_s']:.1f}s, {record.get('tool_calls', 0)} tool call(s)"
+              + (f", error: {record['error']}" if "error" in record else ""))
+        return record
+
+    with open(output, "w") as out:
+        records = await asyncio.gather(*[limited(i, p) for i, p in enumerate(prompts)])
+
+    wall = time.perf_counter() - start
+    latencies = sorted(r["latency_s"] for r in records)
+    failed = sum("error" in r for r in records)
+    if latencies:
+        print(f"{len(records)} runs ({failed} failed) in {wall:.1f}s with concurrency {concurrency}; "
+              f"latency median {latencies[len(latencies) // 2]:.1f}s, max {latencies[-1]:.1f}s, "
+              f"sum {sum(latencies):.1f}s")
+    print(f"Results written to {output}")
+
+async def main(prompt: str):
+    record = await run_one(build_agent(), 0, prompt)
+    if "error" in record:
+        raise SystemExit(f"Agent run failed: {record['error']}")
+    print(record["output"])
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be > 0, got {value}")
+    return number
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -134,6 +216,37 @@ if __name__ == "__main__":
         default="What's the weather in Seoul and Tokyo right now?",
         help="User prompt to send to the agent.",
     )
+    parser.add_argument(
+        "--prompts",
+        type=str,
+        default=None,
+        help="Batch mode: file with one prompt per line (or .jsonl with a 'prompt' field).",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="agent_results.jsonl",
+        help="Batch mode: JSONL file for per-run output, tool call count and latency.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=_positive_int,
+        default=8,
+        help="Batch mode: max agent runs in flight at once.",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Write a Chrome trace / Perfetto JSON here and print a timing summary.",
+    )
     args = parser.parse_args()
-    asyncio.run(main(args.prompt))
+    TRACER.enabled = bool(args.trace)
+    if args.prompts:
+        asyncio.run(run_batch(read_prompts(args.prompts), args.output, args.concurrency))
+    else:
+        asyncio.run(main(args.prompt))
+    if args.trace:
+        TRACER.export_chrome(args.trace)
+        print(TRACER.summary())
 